@@ -1,20 +1,33 @@
+import io
 import os
+import json
+import asyncio
 import logging
-import requests
+import random
+import re
+import time
+import functools
+import concurrent.futures
+import aiohttp
+import redis.asyncio as redis
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
+from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, TypeHandler, filters, CallbackQueryHandler
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab.lib.utils import simpleSplit
 from reportlab.lib.colors import black, blue
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import tempfile
 from translations import LANGUAGES, get_text
 from users import user_manager
 
@@ -33,47 +46,210 @@ TOKEN = os.getenv('TELEGRAM_TOKEN')
 if not TOKEN:
     raise ValueError("TELEGRAM_TOKEN environment variable is required")
 
-def get_user_language(user_id: int) -> str:
+# Shared HTTP session for backend API calls, opened in post_init
+http_session: aiohttp.ClientSession = None
+
+# Background task that periodically writes user changes to disk
+users_flush_task: asyncio.Task = None
+
+# Worker processes for PDF rendering, which is CPU-bound and holds the GIL.
+# Each worker is a fork of the whole bot, and os.cpu_count() reports host
+# CPUs on shared dynos, so the pool is small unless PDF_WORKERS says otherwise.
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', min(2, os.cpu_count() or 1)))
+pdf_pool: concurrent.futures.ProcessPoolExecutor = None
+
+# Optional Redis cache shared by all bot workers; falls back to in-process caching
+REDIS_URL = os.getenv('REDIS_URL')
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+
+async def post_init(application: Application):
+    """Open the shared HTTP session and start background tasks once the event loop is running."""
+    global http_session, users_flush_task, pdf_pool
+    # Keep pooled connections to the backend alive across updates so each
+    # call reuses an open TCP/TLS connection instead of a fresh handshake
+    connector = aiohttp.TCPConnector(limit=20, limit_per_host=10, keepalive_timeout=60)
+    http_session = aiohttp.ClientSession(connector=connector)
+    users_flush_task = asyncio.create_task(user_manager.run_flusher())
+    pdf_pool = concurrent.futures.ProcessPoolExecutor(max_workers=PDF_WORKERS)
+
+async def post_shutdown(application: Application):
+    """Close the shared HTTP session, stop PDF workers and write out pending user changes."""
+    if users_flush_task is not None:
+        users_flush_task.cancel()
+    await user_manager.flush()
+    if http_session is not None:
+        await http_session.close()
+    if redis_client is not None:
+        await redis_client.aclose()
+    if pdf_pool is not None:
+        pdf_pool.shutdown(cancel_futures=True)
+
+class RecoverableError(Exception):
+    """Transient backend failure (5xx) that is safe to retry."""
+
+    def __init__(self, status: int):
+        super().__init__(f"Error: {status}")
+        self.status = status
+
+def raise_for_retry(response: aiohttp.ClientResponse):
+    """Raise RecoverableError for 5xx responses so with_backoff retries them."""
+    if response.status >= 500:
+        raise RecoverableError(response.status)
+
+async def with_backoff(coro_factory, *, retries=3, base=1.0, cap=30.0):
+    """Await coro_factory(), retrying transient failures with exponential backoff and jitter.
+
+    Only use this for idempotent requests: 4xx responses are returned as-is
+    and never retried.
+    """
+    for attempt in range(retries):
+        try:
+            return await coro_factory()
+        except (aiohttp.ClientConnectorError, asyncio.TimeoutError, RecoverableError) as e:
+            if attempt == retries - 1:
+                raise
+            delay = min(cap, base * 2 ** attempt) * (1 + random.random() * 0.5)
+            logger.warning("Backend request failed (%r), retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+
+# Short-lived caches for backend reads shown in menus
+HASHTAGS_CACHE_TTL = 30
+WORDS_CACHE_TTL = 15
+_LOCAL_CACHE = {}  # key -> (monotonic deadline, value), used when Redis is not configured
+# Word list keys come from user input, so bound the local cache instead of letting it grow
+LOCAL_CACHE_MAX_ENTRIES = 256
+
+async def cache_get(key: str):
+    """Return a cached value, or None if it is missing or expired."""
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(key)
+        except redis.RedisError as e:
+            logger.warning("Redis get failed for %s: %s", key, e)
+            return None
+        return json.loads(cached) if cached is not None else None
+    entry = _LOCAL_CACHE.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() < entry[0]:
+        return entry[1]
+    del _LOCAL_CACHE[key]
+    return None
+
+async def cache_set(key: str, value, ttl: int):
+    """Cache a JSON-serializable value for ttl seconds."""
+    if redis_client is not None:
+        try:
+            await redis_client.setex(key, ttl, json.dumps(value, ensure_ascii=False))
+        except redis.RedisError as e:
+            logger.warning("Redis set failed for %s: %s", key, e)
+        return
+    now = time.monotonic()
+    # Re-insert so dict order stays oldest-write first
+    _LOCAL_CACHE.pop(key, None)
+    if len(_LOCAL_CACHE) >= LOCAL_CACHE_MAX_ENTRIES:
+        for stale in [k for k, (deadline, _) in _LOCAL_CACHE.items() if deadline <= now]:
+            del _LOCAL_CACHE[stale]
+        while len(_LOCAL_CACHE) >= LOCAL_CACHE_MAX_ENTRIES:
+            del _LOCAL_CACHE[next(iter(_LOCAL_CACHE))]
+    _LOCAL_CACHE[key] = (now + ttl, value)
+
+async def cache_delete(*keys: str):
+    """Drop cached values so every worker refetches them."""
+    if redis_client is not None:
+        try:
+            await redis_client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning("Redis delete failed for %s: %s", keys, e)
+        return
+    for key in keys:
+        _LOCAL_CACHE.pop(key, None)
+
+async def invalidate_hashtag_cache():
+    """Drop the cached hashtag list after it changes on the backend."""
+    await cache_delete("hashtags:all")
+
+async def invalidate_words_cache(*categories):
+    """Drop cached word lists for the given categories."""
+    if categories:
+        await cache_delete(*(f"words:{category}" for category in categories))
+
+async def load_user_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Look the user up once per update and stash it for the handlers."""
+    if update.effective_user and context.user_data is not None:
+        context.user_data['_user'] = user_manager.get_user(update.effective_user.id)
+
+def get_user_or_none(user_id: int, context: ContextTypes.DEFAULT_TYPE = None) -> Optional[Dict]:
+    """Get user data, preferring the copy stashed by load_user_context."""
+    if context is not None and context.user_data is not None and '_user' in context.user_data:
+        return context.user_data['_user']
+    return user_manager.get_user(user_id)
+
+def get_user_language(user_id: int, context: ContextTypes.DEFAULT_TYPE = None) -> str:
     """Get user's language preference."""
-    user = user_manager.get_user(user_id)
+    user = get_user_or_none(user_id, context)
     if user:
         return user.get('language', 'en')
     return 'en'
 
-def is_user_registered(user_id: int) -> bool:
-    """Check if user is registered."""
-    return user_manager.get_user(user_id) is not None
+async def reply_not_registered(update: Update):
+    """Tell an unregistered user to register first."""
+    lang = 'en'
+    await update.message.reply_text(
+        f"{get_text('profile_not_registered', lang)}\n\n"
+        f"{get_text('profile_register_first', lang)}"
+    )
 
 def require_registration(func):
-    """Decorator to require user registration."""
+    """Decorator to require user registration.
+
+    The user record is looked up once and left in context.user_data['_user']
+    for the wrapped handler.
+    """
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user_id = update.effective_user.id
-        if not is_user_registered(user_id):
-            lang = get_user_language(user_id)
-            await update.message.reply_text(
-                f"{get_text('profile_not_registered', lang)}\n\n"
-                f"{get_text('profile_register_first', lang)}"
-            )
+        user = get_user_or_none(update.effective_user.id, context)
+        if user is None:
+            await reply_not_registered(update)
             return
+        context.user_data['_user'] = user
         return await func(update, context)
     return wrapper
 
 async def check_website_status():
     """Check if the website is running and accessible."""
+    async def fetch():
+        async with http_session.get(
+            "https://amipumpkin.space/api/hashtags",
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            raise_for_retry(response)
+            return response.status
+
     try:
         logger.info("Checking website status...")
-        response = requests.get("https://amipumpkin.space/api/hashtags", timeout=10)
-        logger.info(f"Website status check result: {response.status_code}")
-        return response.status_code == 200
+        status = await with_backoff(fetch)
+        logger.info("Website status check result: %s", status)
+        return status == 200
     except Exception as e:
-        logger.error(f"Website status check failed: {e}")
+        logger.error("Website status check failed: %s", e)
         return False
 
+# Whitespace-separated words starting with '#', same as split() + startswith('#')
+_HASHTAG_RE = re.compile(r"(?<!\S)#\S*")
+
+def extract_hashtags(text):
+    """Extract hashtags from message text."""
+    # Most messages have no '#', and the substring check is far cheaper than the regex scan
+    if '#' not in text:
+        return []
+    return _HASHTAG_RE.findall(text)
+
 async def send_message_to_website(text, user_id, username):
     """Send message to the website API."""
     try:
         # Extract hashtags from text
-        hashtags = [word for word in text.split() if word.startswith('#')]
+        hashtags = extract_hashtags(text)
         category = hashtags[0] if hashtags else "#слова"  # Default category
         
         # Prepare data for API
@@ -86,22 +262,24 @@ async def send_message_to_website(text, user_id, username):
         }
         
         # Send to website API
-        response = requests.post(
+        async with http_session.post(
             "https://amipumpkin.space/api/messages",
             json=data,
-            headers={"Content-Type": "application/json"},
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            return True, "Message sent successfully!"
-        else:
-            return False, f"Error: {response.status_code}"
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            if response.status == 200:
+                await invalidate_words_cache(*hashtags)
+                return True, "Message sent successfully!"
+            else:
+                return False, f"Error: {response.status}"
             
-    except requests.exceptions.ConnectionError:
+    except aiohttp.ClientConnectorError:
         return False, "Website is not running. Please start the website first."
+    except asyncio.TimeoutError:
+        logger.error("Timeout error when sending message to website")
+        return False, "Request timed out. Please try again."
     except Exception as e:
-        logger.error(f"Error sending message to website: {e}")
+        logger.error("Error sending message to website: %s", e)
         return False, f"Error: {str(e)}"
 
 async def sync_user_to_backend(user_id: int):
@@ -122,26 +300,35 @@ async def sync_user_to_backend(user_id: int):
             "stats": user.get('stats', {})
         }
         
+        async def post():
+            async with http_session.post(
+                "https://amipumpkin.space/api/users",
+                json=user_data,
+                timeout=aiohttp.ClientTimeout(total=15)
+            ) as response:
+                raise_for_retry(response)
+                return response.status
+
         # Send to backend API
-        response = requests.post(
-            "https://amipumpkin.space/api/users",
-            json=user_data,
-            headers={"Content-Type": "application/json"},
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            logger.info(f"User {user_id} synced to backend successfully")
+        status = await with_backoff(post)
+        if status == 200:
+            logger.info("User %s synced to backend successfully", user_id)
             return True, "User synced successfully"
         else:
-            logger.error(f"Backend sync failed for user {user_id}: {response.status_code}")
-            return False, f"Backend sync failed: {response.status_code}"
+            logger.error("Backend sync failed for user %s: %s", user_id, status)
+            return False, f"Backend sync failed: {status}"
             
-    except requests.exceptions.ConnectionError:
-        logger.error(f"Backend not available for user sync: {user_id}")
+    except RecoverableError as e:
+        logger.error("Backend sync failed for user %s: %s", user_id, e.status)
+        return False, f"Backend sync failed: {e.status}"
+    except aiohttp.ClientConnectorError:
+        logger.error("Backend not available for user sync: %s", user_id)
         return False, "Backend not available"
+    except asyncio.TimeoutError:
+        logger.error("Timeout error when syncing user %s to backend", user_id)
+        return False, "Backend sync timed out"
     except Exception as e:
-        logger.error(f"Error syncing user to backend: {e}")
+        logger.error("Error syncing user to backend: %s", e)
         return False, f"Sync error: {str(e)}"
 
 async def create_hashtag(hashtag_name, description=""):
@@ -152,106 +339,144 @@ async def create_hashtag(hashtag_name, description=""):
             "description": description
         }
         
-        response = requests.post(
+        async with http_session.post(
             "https://amipumpkin.space/api/hashtags",
             json=data,
-            headers={"Content-Type": "application/json"},
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            return True, "Hashtag created successfully!"
-        elif response.status_code == 409:
-            return False, "Hashtag already exists!"
-        else:
-            return False, f"Error: {response.status_code}"
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            if response.status == 200:
+                await invalidate_hashtag_cache()
+                return True, "Hashtag created successfully!"
+            elif response.status == 409:
+                return False, "Hashtag already exists!"
+            else:
+                return False, f"Error: {response.status}"
             
-    except requests.exceptions.ConnectionError:
+    except aiohttp.ClientConnectorError:
         return False, "Website is not running. Please start the website first."
+    except asyncio.TimeoutError:
+        logger.error("Timeout error when creating hashtag")
+        return False, "Request timed out. Please try again."
     except Exception as e:
-        logger.error(f"Error creating hashtag: {e}")
+        logger.error("Error creating hashtag: %s", e)
         return False, f"Error: {str(e)}"
 
 async def delete_hashtag(hashtag_name):
     """Delete a hashtag from the website."""
     try:
-        response = requests.delete(
-            f"https://amipumpkin.space/api/hashtags?name={hashtag_name}",
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            return True, "Hashtag deleted successfully!"
-        elif response.status_code == 404:
-            return False, "Hashtag not found!"
-        else:
-            return False, f"Error: {response.status_code}"
+        async with http_session.delete(
+            "https://amipumpkin.space/api/hashtags",
+            params={"name": hashtag_name},
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            if response.status == 200:
+                await invalidate_hashtag_cache()
+                await invalidate_words_cache(hashtag_name)
+                return True, "Hashtag deleted successfully!"
+            elif response.status == 404:
+                return False, "Hashtag not found!"
+            else:
+                return False, f"Error: {response.status}"
             
-    except requests.exceptions.ConnectionError:
+    except aiohttp.ClientConnectorError:
         return False, "Website is not running. Please start the website first."
+    except asyncio.TimeoutError:
+        logger.error("Timeout error when deleting hashtag")
+        return False, "Request timed out. Please try again."
     except Exception as e:
-        logger.error(f"Error deleting hashtag: {e}")
+        logger.error("Error deleting hashtag: %s", e)
         return False, f"Error: {str(e)}"
 
 async def get_hashtags():
     """Get all hashtags from the website."""
-    try:
-        response = requests.get(
+    cached = await cache_get("hashtags:all")
+    if cached is not None:
+        return True, cached
+
+    async def fetch():
+        async with http_session.get(
             "https://amipumpkin.space/api/hashtags",
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            hashtags = response.json()
-            return True, hashtags
-        else:
-            return False, f"Error: {response.status_code}"
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            raise_for_retry(response)
+            if response.status == 200:
+                # Like requests' .json(), parse the body whatever its Content-Type
+                hashtags = await response.json(content_type=None)
+                return True, hashtags
+            else:
+                return False, f"Error: {response.status}"
+
+    try:
+        success, result = await with_backoff(fetch)
+        if success:
+            await cache_set("hashtags:all", result, HASHTAGS_CACHE_TTL)
+        return success, result
             
-    except requests.exceptions.ConnectionError:
+    except RecoverableError as e:
+        return False, str(e)
+    except aiohttp.ClientConnectorError:
         return False, "Website is not running. Please start the website first."
+    except asyncio.TimeoutError:
+        logger.error("Timeout error when getting hashtags")
+        return False, "Request timed out. Please try again."
     except Exception as e:
-        logger.error(f"Error getting hashtags: {e}")
+        logger.error("Error getting hashtags: %s", e)
         return False, f"Error: {str(e)}"
 
 async def get_words_by_category(category):
     """Get all words from a specific category."""
-    try:
-        logger.info(f"Fetching words for category: {category}")
-        response = requests.get(
+    cached = await cache_get(f"words:{category}")
+    if cached is not None:
+        return True, cached
+
+    async def fetch():
+        async with http_session.get(
             "https://amipumpkin.space/api/messages",
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            messages = response.json()
-            logger.info(f"Received {len(messages)} total messages")
-            # Filter messages by category
-            category_words = [msg for msg in messages if msg.get('category') == category]
-            logger.info(f"Found {len(category_words)} words in category {category}")
-            return True, category_words
-        else:
-            logger.error(f"API returned status code: {response.status_code}")
-            return False, f"Error: {response.status_code}"
+            params={"category": category},
+            timeout=aiohttp.ClientTimeout(total=15)
+        ) as response:
+            raise_for_retry(response)
+            if response.status == 200:
+                messages = await response.json(content_type=None)
+                logger.info("Received %d messages", len(messages))
+                # The backend filters by category; keep the check for older backends
+                # that ignore the parameter and return every message
+                category_words = [msg for msg in messages if msg.get('category') == category]
+                logger.info("Found %d words in category %s", len(category_words), category)
+                return True, category_words
+            else:
+                logger.error("API returned status code: %s", response.status)
+                return False, f"Error: {response.status}"
+
+    try:
+        logger.info("Fetching words for category: %s", category)
+        success, result = await with_backoff(fetch)
+        if success:
+            await cache_set(f"words:{category}", result, WORDS_CACHE_TTL)
+        return success, result
             
-    except requests.exceptions.ConnectionError:
+    except RecoverableError as e:
+        logger.error("API returned status code: %s", e.status)
+        return False, str(e)
+    except aiohttp.ClientConnectorError:
         logger.error("Connection error when fetching words by category")
         return False, "Website is not running. Please start the website first."
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("Timeout error when fetching words by category")
         return False, "Request timed out. Please try again."
     except Exception as e:
-        logger.error(f"Error getting words by category: {e}")
+        logger.error("Error getting words by category: %s", e)
         return False, f"Error: {str(e)}"
 
 async def handle_create_hashtag(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle creating hashtags."""
     user_id = update.effective_user.id
     text = update.message.text.strip()
-    lang = get_user_language(user_id)
+    lang = get_user_language(user_id, context)
     
     # Check if user is in create hashtag mode
-    if context.user_data.get('awaiting_hashtag_create'):
-        context.user_data['awaiting_hashtag_create'] = False
+    if context.user_data.get('_state') == 'create_hashtag':
+        context.user_data.pop('_state', None)
         
         # Parse hashtag name and description
         parts = text.split(' ', 1)
@@ -260,10 +485,11 @@ async def handle_create_hashtag(update: Update, context: ContextTypes.DEFAULT_TY
         
         # Validate hashtag format
         if not hashtag_name.startswith('#'):
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('hashtag_must_start', lang)}\n\n"
                 f"{get_text('hashtag_example', lang)}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
             return
         
@@ -274,21 +500,20 @@ async def handle_create_hashtag(update: Update, context: ContextTypes.DEFAULT_TY
             # Increment hashtags created statistic
             user_manager.increment_stat(user_id, 'hashtags_created')
             
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('hashtag_created', lang)}\n\n"
                 f"{get_text('hashtag_name', lang)} {hashtag_name}\n"
                 f"{get_text('description', lang)} {description or get_text('no_description', lang)}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
         else:
-            await update.message.reply_text(
-                f"❌ {message}",
-                reply_markup=get_main_keyboard(lang)
-            )
+            await reply(update, f"❌ {message}", lang)
     else:
         # First time - ask for hashtag
-        context.user_data['awaiting_hashtag_create'] = True
-        await update.message.reply_text(
+        context.user_data['_state'] = 'create_hashtag'
+        await reply(
+            update,
             f"{get_text('create_hashtag_mode', lang)}\n\n"
             f"{get_text('send_hashtag', lang)}\n\n"
             f"{get_text('format', lang)}\n\n"
@@ -296,25 +521,33 @@ async def handle_create_hashtag(update: Update, context: ContextTypes.DEFAULT_TY
             f"{get_text('new_hashtag_example', lang)}\n"
             f"{get_text('dictionary_example', lang)}\n"
             f"{get_text('grammar_example', lang)}",
-            reply_markup=get_main_keyboard(lang)
+            lang
         )
 
+async def send_typing(update: Update):
+    """Show the typing indicator; it is cosmetic, so failures are only logged."""
+    try:
+        await update.message.reply_chat_action(ChatAction.TYPING)
+    except TelegramError as e:
+        logger.warning("Could not send typing action: %s", e)
+
 async def handle_delete_hashtag(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle deleting hashtags."""
     user_id = update.effective_user.id
     text = update.message.text.strip()
-    lang = get_user_language(user_id)
+    lang = get_user_language(user_id, context)
     
     # Check if user is in delete hashtag mode
-    if context.user_data.get('awaiting_hashtag_delete'):
-        context.user_data['awaiting_hashtag_delete'] = False
+    if context.user_data.get('_state') == 'delete_hashtag':
+        context.user_data.pop('_state', None)
         
         # Validate hashtag format
         if not text.startswith('#'):
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('hashtag_must_start', lang)}\n\n"
                 f"{get_text('delete_example', lang)}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
             return
         
@@ -325,60 +558,55 @@ async def handle_delete_hashtag(update: Update, context: ContextTypes.DEFAULT_TY
             # Increment hashtags deleted statistic
             user_manager.increment_stat(user_id, 'hashtags_deleted')
             
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('hashtag_deleted', lang)}\n\n"
                 f"{get_text('deleted_hashtag', lang)} {text}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
         else:
-            await update.message.reply_text(
-                f"❌ {message}",
-                reply_markup=get_main_keyboard(lang)
-            )
+            await reply(update, f"❌ {message}", lang)
     else:
-        # First time - show available hashtags and ask for one to delete
-        success, result = await get_hashtags()
+        # First time - show available hashtags and ask for one to delete.
+        # Enter the state before awaiting: with concurrent updates, a reply sent
+        # while the list loads must still reach this flow, not the word-save branch
+        context.user_data['_state'] = 'delete_hashtag'
+        (success, result), _ = await asyncio.gather(get_hashtags(), send_typing(update))
         
         if success:
             hashtags = result
             if hashtags:
                 hashtag_list = "\n".join([f"• {h['name']}" for h in hashtags])
-                await update.message.reply_text(
+                await reply(
+                    update,
                     f"{get_text('delete_hashtag_mode', lang)}\n\n"
                     f"{get_text('available_hashtags', lang)}:\n{hashtag_list}\n\n"
                     f"{get_text('send_hashtag_to_delete', lang)}\n"
                     f"{get_text('delete_example', lang)}",
-                    reply_markup=get_main_keyboard(lang)
+                    lang
                 )
             else:
-                await update.message.reply_text(
-                    get_text('no_hashtags_found', lang),
-                    reply_markup=get_main_keyboard(lang)
-                )
+                await reply(update, get_text('no_hashtags_found', lang), lang)
         else:
-            await update.message.reply_text(
-                f"❌ {result}",
-                reply_markup=get_main_keyboard(lang)
-            )
-        
-        context.user_data['awaiting_hashtag_delete'] = True
+            await reply(update, f"❌ {result}", lang)
 
 async def handle_import_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle importing word lists as PDF."""
     user_id = update.effective_user.id
     text = update.message.text.strip()
-    lang = get_user_language(user_id)
+    lang = get_user_language(user_id, context)
     
     # Check if user is in import mode
-    if context.user_data.get('awaiting_category_import'):
-        context.user_data['awaiting_category_import'] = False
+    if context.user_data.get('_state') == 'import_list':
+        context.user_data.pop('_state', None)
         
         # Validate hashtag format
         if not text.startswith('#'):
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('category_must_start', lang)}\n\n"
                 f"{get_text('import_example', lang)}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
             return
         
@@ -388,101 +616,97 @@ async def handle_import_list(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if success:
             words = result
             if words:
-                # Generate PDF
-                pdf_path = generate_pdf(words, text)
+                await update.message.reply_text(get_text('generating_pdf', lang))
                 
-                if pdf_path:
+                # Render in a worker process so concurrent PDFs use separate cores
+                pdf_bytes = await render_pdf(words, text)
+                
+                if pdf_bytes is not None:
                     try:
                         # Increment PDFs generated statistic
                         user_manager.increment_stat(user_id, 'pdfs_generated')
                         
-                        # Send PDF file
-                        with open(pdf_path, 'rb') as pdf_file:
-                            await update.message.reply_document(
-                                document=pdf_file,
-                                filename=f"{text}_word_list.pdf",
-                                caption=f"📄 {get_text('word_list_for', lang)} {text}\n\n"
-                                       f"{get_text('total_words', lang)}: {len(words)}\n"
-                                       f"{get_text('generated_on', lang)}: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                            )
-                        
-                        # Clean up temporary file
-                        os.remove(pdf_path)
+                        # Send PDF straight from memory
+                        await update.message.reply_document(
+                            document=pdf_bytes,
+                            filename=f"{text}_word_list.pdf",
+                            caption=f"📄 {get_text('word_list_for', lang)} {text}\n\n"
+                                   f"{get_text('total_words', lang)}: {len(words)}\n"
+                                   f"{get_text('generated_on', lang)}: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                        )
                         
                     except Exception as e:
-                        logger.error(f"Error sending PDF: {e}")
-                        await update.message.reply_text(
-                            get_text('error_sending_pdf', lang),
-                            reply_markup=get_main_keyboard(lang)
-                        )
+                        logger.error("Error sending PDF: %s", e)
+                        await reply(update, get_text('error_sending_pdf', lang), lang)
                 else:
-                    await update.message.reply_text(
-                        get_text('error_generating_pdf', lang),
-                        reply_markup=get_main_keyboard(lang)
-                    )
+                    await reply(update, get_text('error_generating_pdf', lang), lang)
             else:
-                await update.message.reply_text(
-                    f"{get_text('no_words_found', lang)} {text}.",
-                    reply_markup=get_main_keyboard(lang)
-                )
+                await reply(update, f"{get_text('no_words_found', lang)} {text}.", lang)
         else:
-            await update.message.reply_text(
-                f"❌ {result}",
-                reply_markup=get_main_keyboard(lang)
-            )
+            await reply(update, f"❌ {result}", lang)
     else:
-        # First time - show available categories and ask for one to import
-        success, result = await get_hashtags()
+        # First time - show available categories and ask for one to import.
+        # Enter the state before awaiting: with concurrent updates, a reply sent
+        # while the list loads must still reach this flow, not the word-save branch
+        context.user_data['_state'] = 'import_list'
+        (success, result), _ = await asyncio.gather(get_hashtags(), send_typing(update))
         
         if success:
             hashtags = result
             if hashtags:
                 hashtag_list = "\n".join([f"• {h['name']}" for h in hashtags])
-                await update.message.reply_text(
+                await reply(
+                    update,
                     f"{get_text('import_list_mode', lang)}\n\n"
                     f"{get_text('available_categories', lang)}:\n{hashtag_list}\n\n"
                     f"{get_text('send_category_to_import', lang)}\n"
                     f"{get_text('import_example', lang)}",
-                    reply_markup=get_main_keyboard(lang)
+                    lang
                 )
             else:
-                await update.message.reply_text(
-                    get_text('no_categories_found', lang),
-                    reply_markup=get_main_keyboard(lang)
-                )
+                await reply(update, get_text('no_categories_found', lang), lang)
         else:
-            await update.message.reply_text(
-                f"❌ {result}",
-                reply_markup=get_main_keyboard(lang)
-            )
-        
-        context.user_data['awaiting_category_import'] = True
+            await reply(update, f"❌ {result}", lang)
 
 async def handle_open_website(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle opening the website."""
     user_id = update.effective_user.id
-    lang = get_user_language(user_id)
+    lang = get_user_language(user_id, context)
     
     website_url = get_text('website_url', lang)
     
-    await update.message.reply_text(
+    await reply(
+        update,
         f"{get_text('website_link', lang)}\n\n"
         f"🔗 {website_url}",
-        reply_markup=get_main_keyboard(lang)
+        lang,
+        disable_web_page_preview=False
     )
 
+async def finalize_user_sync(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int, message_id: int, lang: str):
+    """Sync a new user to the backend and show the result in the sync status message."""
+    sync_success, sync_message = await sync_user_to_backend(user_id)
+    
+    if sync_success:
+        sync_status = f"✅ {get_text('user_synced_backend', lang) if 'user_synced_backend' in LANGUAGES[lang] else 'User data synced to website'}"
+    else:
+        sync_status = f"⚠️ {get_text('user_sync_failed', lang) if 'user_sync_failed' in LANGUAGES[lang] else 'User data sync failed (website offline)'}"
+    
+    try:
+        await context.bot.edit_message_text(sync_status, chat_id=chat_id, message_id=message_id)
+    except TelegramError as e:
+        logger.error("Error updating registration message for user %s: %s", user_id, e)
+
 async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle user registration."""
     user = update.effective_user
     user_id = user.id
     
     # Check if user is already registered
-    if is_user_registered(user_id):
-        lang = get_user_language(user_id)
-        await update.message.reply_text(
-            get_text('user_already_registered', lang),
-            reply_markup=get_main_keyboard(lang)
-        )
+    existing_user = get_user_or_none(user_id, context)
+    if existing_user is not None:
+        lang = existing_user.get('language', 'en')
+        await reply(update, get_text('user_already_registered', lang), lang)
         return
     
     # Register new user
@@ -494,39 +718,31 @@ async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     if success:
+        context.user_data['_user'] = user_manager.get_user(user_id)
+        
         # Set default language to English for new users
         lang = 'en'
         user_manager.update_user_language(user_id, lang)
         
-        # Try to sync user data to backend
-        sync_success, sync_message = await sync_user_to_backend(user_id)
-        
         welcome_message = f"{get_text('registration_successful', lang)}\n\n{get_text('registration_welcome', lang)}"
         
-        if sync_success:
-            welcome_message += f"\n\n✅ {get_text('user_synced_backend', lang) if 'user_synced_backend' in LANGUAGES[lang] else 'User data synced to website'}"
-        else:
-            welcome_message += f"\n\n⚠️ {get_text('user_sync_failed', lang) if 'user_sync_failed' in LANGUAGES[lang] else 'User data sync failed (website offline)'}"
-        
-        await update.message.reply_text(
-            welcome_message,
-            reply_markup=get_main_keyboard(lang)
+        # The welcome message carries the main keyboard, and Telegram cannot edit
+        # messages with a reply keyboard, so the sync result goes in its own
+        # markup-less status message that is filled in once the backend answers
+        await reply(update, welcome_message, lang)
+        status = await update.message.reply_text(f"⏳ {get_text('user_sync_pending', lang)}")
+        context.application.create_task(
+            finalize_user_sync(context, user_id, status.chat_id, status.message_id, lang),
+            update=update
         )
     else:
         await update.message.reply_text("❌ Registration failed. Please try again.")
 
+@require_registration
 async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user profile."""
     user_id = update.effective_user.id
     
-    if not is_user_registered(user_id):
-        lang = get_user_language(user_id)
-        await update.message.reply_text(
-            f"{get_text('profile_not_registered', lang)}\n\n"
-            f"{get_text('profile_register_first', lang)}"
-        )
-        return
-    
     # Get user profile
     profile = user_manager.get_user_profile(user_id)
     lang = profile.get('language', 'en')
@@ -554,10 +770,7 @@ async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     profile_message += f"• {get_text('profile_pdfs_generated', lang)}: {stats['pdfs_generated']}\n"
     profile_message += f"• {get_text('profile_total_messages', lang)}: {stats['total_messages']}"
     
-    await update.message.reply_text(
-        profile_message,
-        reply_markup=get_main_keyboard(lang)
-    )
+    await reply(update, profile_message, lang)
 
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle callback queries from inline buttons."""
@@ -570,59 +783,44 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     # For now, we only have website button which opens URL directly
     # No additional action needed as the URL opens automatically
 
+@require_registration
 async def handle_language_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle language selection."""
     user_id = update.effective_user.id
     text = update.message.text.strip()
     
-    # Check if user is registered
-    if not is_user_registered(user_id):
-        lang = 'en'
-        await update.message.reply_text(
-            f"{get_text('profile_not_registered', lang)}\n\n"
-            f"{get_text('profile_register_first', lang)}"
-        )
-        return
-    
     # Update user activity
     user_manager.update_user_activity(user_id)
     
     # Check if user is in language selection mode
-    if context.user_data.get('awaiting_language'):
-        context.user_data['awaiting_language'] = False
+    if context.user_data.get('_state') == 'language':
+        context.user_data.pop('_state', None)
         
         # Get user's language choice
         lang_choice = text.lower().strip()
         
         if lang_choice in ['1', 'english', 'en', 'английский']:
             user_manager.update_user_language(user_id, 'en')
-            await update.message.reply_text(
-                get_text('language_set_english', 'en'),
-                reply_markup=get_main_keyboard('en')
-            )
+            await reply(update, get_text('language_set_english', 'en'), 'en')
         elif lang_choice in ['2', 'русский', 'ru', 'russian']:
             user_manager.update_user_language(user_id, 'ru')
-            await update.message.reply_text(
-                get_text('language_set_russian', 'ru'),
-                reply_markup=get_main_keyboard('ru')
-            )
+            await reply(update, get_text('language_set_russian', 'ru'), 'ru')
         elif lang_choice in ['3', 'узбекский', 'uz', 'uzbek', 'o\'zbek']:
             user_manager.update_user_language(user_id, 'uz')
-            await update.message.reply_text(
-                get_text('language_set_uzbek', 'uz'),
-                reply_markup=get_main_keyboard('uz')
-            )
+            await reply(update, get_text('language_set_uzbek', 'uz'), 'uz')
         else:
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"{get_text('invalid_language_choice', 'en')}\n"
                 f"{get_text('invalid_language_choice', 'ru')}\n"
                 f"{get_text('invalid_language_choice', 'uz')}",
-                reply_markup=get_main_keyboard()
+                'en'
             )
     else:
         # First time - show language options
-        context.user_data['awaiting_language'] = True
-        await update.message.reply_text(
+        context.user_data['_state'] = 'language'
+        await reply(
+            update,
             f"{get_text('choose_language', 'en')} / {get_text('choose_language', 'ru')} / {get_text('choose_language', 'uz')}:\n\n"
             f"1. {get_text('english_option', 'en')} / {get_text('english_option', 'ru')} / {get_text('english_option', 'uz')}\n"
             f"2. {get_text('russian_option', 'en')} / {get_text('russian_option', 'ru')} / {get_text('russian_option', 'uz')}\n"
@@ -630,11 +828,11 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
             f"{get_text('send_number_or_name', 'en')}\n"
             f"{get_text('send_number_or_name', 'ru')}\n"
             f"{get_text('send_number_or_name', 'uz')}",
-            reply_markup=get_main_keyboard()
+            'en'
         )
 
-def get_main_keyboard(lang='en'):
-    """Get the main keyboard layout."""
+def _build_main_keyboard(lang):
+    """Build the main keyboard layout."""
     keyboard = [
         [KeyboardButton(get_text('create_hashtag', lang)), KeyboardButton(get_text('delete_hashtag', lang))],
         [KeyboardButton(get_text('import_list', lang)), KeyboardButton(get_text('help', lang))],
@@ -643,19 +841,54 @@ def get_main_keyboard(lang='en'):
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
-def get_website_inline_keyboard(lang='en'):
-    """Get inline keyboard with website button."""
+def _build_website_inline_keyboard(lang):
+    """Build inline keyboard with website button."""
     keyboard = [
         [InlineKeyboardButton(get_text('open_website', lang), url=get_text('website_url', lang))]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+# Keyboards never change at runtime, so build them once per language
+_KEYBOARDS = {lang: _build_main_keyboard(lang) for lang in LANGUAGES}
+_WEBSITE_KEYBOARDS = {lang: _build_website_inline_keyboard(lang) for lang in LANGUAGES}
+
+def get_main_keyboard(lang='en'):
+    """Get the main keyboard layout."""
+    return _KEYBOARDS.get(lang, _KEYBOARDS['en'])
+
+def get_website_inline_keyboard(lang='en'):
+    """Get inline keyboard with website button."""
+    return _WEBSITE_KEYBOARDS.get(lang, _WEBSITE_KEYBOARDS['en'])
+
+async def reply(update: Update, text: str, lang: str = 'en', **kwargs):
+    """Reply to the update's message with the main keyboard attached."""
+    kwargs.setdefault('disable_web_page_preview', True)
+    return await update.message.reply_text(text, reply_markup=get_main_keyboard(lang), **kwargs)
+
+def _render_help_message(lang):
+    """Render the welcome/help text shown by /start and /help."""
+    return (
+        f"{get_text('welcome', lang)}\n\n"
+        f"{get_text('welcome_desc', lang)}\n\n"
+        f"{get_text('hashtag_help', lang)}\n"
+        f"• #заметка - {get_text('notes', lang)}\n"
+        f"• #разборка - {get_text('grammar_analysis', lang)}\n"
+        f"• #фразы - {get_text('useful_phrases', lang)}\n"
+        f"• #слова - {get_text('new_words', lang)}\n"
+        f"• #грамматика - {get_text('grammar_rules', lang)}\n\n"
+        f"{get_text('example', lang)}"
+    )
+
+# The welcome/help text is static, so render it once per language
+HELP_MESSAGES = {lang: _render_help_message(lang) for lang in LANGUAGES}
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     user_id = update.effective_user.id
     
     # Check if user is registered
-    if not is_user_registered(user_id):
+    user = get_user_or_none(user_id, context)
+    if user is None:
         lang = 'en'  # Default language for new users
         welcome_message = (
             f"{get_text('welcome', lang)}\n\n"
@@ -665,55 +898,62 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Get user's language preference
-    lang = get_user_language(user_id)
+    lang = user.get('language', 'en')
     
     # Update user activity
     user_manager.update_user_activity(user_id)
     
-    welcome_message = (
-        f"{get_text('welcome', lang)}\n\n"
-        f"{get_text('welcome_desc', lang)}\n\n"
-        f"{get_text('hashtag_help', lang)}\n"
-        f"• #заметка - {get_text('notes', lang)}\n"
-        f"• #разборка - {get_text('grammar_analysis', lang)}\n"
-        f"• #фразы - {get_text('useful_phrases', lang)}\n"
-        f"• #слова - {get_text('new_words', lang)}\n"
-        f"• #грамматика - {get_text('grammar_rules', lang)}\n\n"
-        f"{get_text('example', lang)}"
-    )
-    await update.message.reply_text(welcome_message, reply_markup=get_main_keyboard(lang))
+    await reply(update, HELP_MESSAGES.get(lang, HELP_MESSAGES['en']), lang)
 
+@require_registration
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /help is issued."""
     user_id = update.effective_user.id
     
-    # Check if user is registered
-    if not is_user_registered(user_id):
-        lang = 'en'
-        await update.message.reply_text(
-            f"{get_text('profile_not_registered', lang)}\n\n"
-            f"{get_text('profile_register_first', lang)}"
-        )
-        return
-    
     # Get user's language preference
-    lang = get_user_language(user_id)
+    lang = context.user_data['_user'].get('language', 'en')
     
     # Update user activity
     user_manager.update_user_activity(user_id)
     
-    help_message = (
-        f"{get_text('welcome', lang)}\n\n"
-        f"{get_text('welcome_desc', lang)}\n\n"
-        f"{get_text('hashtag_help', lang)}\n"
-        f"• #заметка - {get_text('notes', lang)}\n"
-        f"• #разборка - {get_text('grammar_analysis', lang)}\n"
-        f"• #фразы - {get_text('useful_phrases', lang)}\n"
-        f"• #слова - {get_text('new_words', lang)}\n"
-        f"• #грамматика - {get_text('grammar_rules', lang)}\n\n"
-        f"{get_text('example', lang)}"
-    )
-    await update.message.reply_text(help_message, reply_markup=get_main_keyboard(lang))
+    await reply(update, HELP_MESSAGES.get(lang, HELP_MESSAGES['en']), lang)
+
+# Menu button handlers, keyed by the button's translation key
+_MENU_HANDLERS = {
+    'help': help_command,
+    'create_hashtag': handle_create_hashtag,
+    'delete_hashtag': handle_delete_hashtag,
+    'import_list': handle_import_list,
+    'language_button': handle_language_selection,
+    'open_website': handle_open_website,
+    'profile': profile_command,
+    'register': register_command,
+}
+
+# Pending-input state in context.user_data['_state'] -> handler that consumes the reply
+_STATE_HANDLERS = {
+    'create_hashtag': handle_create_hashtag,
+    'delete_hashtag': handle_delete_hashtag,
+    'import_list': handle_import_list,
+    'language': handle_language_selection,
+}
+
+# Lowercased button label -> handler, built once per language
+_DISPATCH = {
+    lang: {get_text(key, lang).lower(): handler for key, handler in _MENU_HANDLERS.items()}
+    for lang in LANGUAGES
+}
+
+# Unregistered users only see the English keyboard
+_REGISTER_LABEL = get_text('register', 'en').lower()
+
+# Hashtag usage reminder for messages that match nothing else, built once per language
+_EXAMPLES_TEXT = {
+    lang: f"{get_text('send_hashtag_message', lang)}\n\n"
+          f"{get_text('examples', lang)}:\n"
+          f"{get_text(f'examples_{lang}' if f'examples_{lang}' in LANGUAGES[lang] else 'examples_en', lang)}"
+    for lang in LANGUAGES
+}
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages and menu button presses."""
@@ -722,197 +962,274 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lower_text = text.lower()
     
     # Check if user is registered for most functions
-    if not is_user_registered(user_id):
-        lang = 'en'
-        if lower_text == get_text("register", lang).lower():
+    user = get_user_or_none(user_id, context)
+    if user is None:
+        if lower_text == _REGISTER_LABEL:
             await register_command(update, context)
             return
         else:
-            await update.message.reply_text(
-                f"{get_text('profile_not_registered', lang)}\n\n"
-                f"{get_text('profile_register_first', lang)}"
-            )
+            await reply_not_registered(update)
             return
     
     # Get user's language preference
-    lang = get_user_language(user_id)
+    lang = user.get('language', 'en')
     
     # Update user activity
     user_manager.update_user_activity(user_id)
 
-    # Check if user is in create hashtag mode
-    if context.user_data.get('awaiting_hashtag_create'):
-        await handle_create_hashtag(update, context)
-        return
-
-    # Check if user is in delete hashtag mode
-    if context.user_data.get('awaiting_hashtag_delete'):
-        await handle_delete_hashtag(update, context)
-        return
-
-    # Check if user is in import mode
-    if context.user_data.get('awaiting_category_import'):
-        await handle_import_list(update, context)
-        return
-
-    # Check if user is in language selection mode
-    if context.user_data.get('awaiting_language'):
-        await handle_language_selection(update, context)
+    # Hand the reply to the flow that is waiting for it, if any
+    state = context.user_data.get('_state')
+    if state:
+        await _STATE_HANDLERS[state](update, context)
         return
 
     # Check if message contains hashtags - automatically send to website
-    hashtags = [word for word in text.split() if word.startswith('#')]
+    hashtags = extract_hashtags(text)
     if hashtags:
-        # Send message to website
-        success, message = await send_message_to_website(
+        # Send message to website, building the confirmation while the request is in flight
+        send_task = asyncio.create_task(send_message_to_website(
             text, 
             update.effective_user.id, 
             update.effective_user.username or update.effective_user.first_name
+        ))
+        saved_text = (
+            f"{get_text('word_saved', lang)}\n\n"
+            f"{get_text('word', lang)}: {text}\n"
+            f"{get_text('category', lang)}: {hashtags[0]}\n\n"
+            f"{get_text('check_website', lang)}"
         )
+        success, message = await send_task
         
         if success:
             # Increment words saved statistic
             user_manager.increment_stat(user_id, 'words_saved')
             
-            await update.message.reply_text(
-                f"{get_text('word_saved', lang)}\n\n"
-                f"{get_text('word', lang)}: {text}\n"
-                f"{get_text('category', lang)}: {hashtags[0]}\n\n"
-                f"{get_text('check_website', lang)}",
-                reply_markup=get_main_keyboard(lang)
-            )
+            await reply(update, saved_text, lang)
         else:
-            await update.message.reply_text(
+            await reply(
+                update,
                 f"❌ {message}\n\n"
                 f"{get_text('website_not_running', lang)}",
-                reply_markup=get_main_keyboard(lang)
+                lang
             )
         return
 
-    if lower_text == get_text("help", lang).lower():
-        await help_command(update, context)
-    elif lower_text == get_text("create_hashtag", lang).lower():
-        await handle_create_hashtag(update, context)
-    elif lower_text == get_text("delete_hashtag", lang).lower():
-        await handle_delete_hashtag(update, context)
-    elif lower_text == get_text("import_list", lang).lower():
-        await handle_import_list(update, context)
-    elif lower_text == get_text("language_button", lang).lower():
-        await handle_language_selection(update, context)
-    elif lower_text == get_text("open_website", lang).lower():
-        await handle_open_website(update, context)
-    elif lower_text == get_text("profile", lang).lower():
-        await profile_command(update, context)
-    elif lower_text == get_text("register", lang).lower():
-        await register_command(update, context)
+    handler = _DISPATCH.get(lang, _DISPATCH['en']).get(lower_text)
+    if handler:
+        await handler(update, context)
     else:
         # If message doesn't contain hashtags, remind user about hashtag usage
-        await update.message.reply_text(
-            f"{get_text('send_hashtag_message', lang)}\n\n"
-            f"{get_text('examples', lang)}:\n"
-            f"{get_text('examples_' + lang, lang) if f'examples_{lang}' in LANGUAGES[lang] else get_text('examples_en', lang)}",
-            reply_markup=get_main_keyboard(lang)
-        )
+        await reply(update, _EXAMPLES_TEXT.get(lang, _EXAMPLES_TEXT['en']), lang)
 
-def generate_pdf(words, category_name):
-    """Generate a PDF file with words from a category."""
-    try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            pdf_path = tmp_file.name
+# PDF styles never change, so build them once at import time.
+# Use simple, built-in fonts that work well
+_STYLES = getSampleStyleSheet()
+
+_TITLE_STYLE = ParagraphStyle(
+    'Title',
+    parent=_STYLES['Heading1'],
+    fontSize=18,
+    spaceAfter=20,
+    alignment=1,
+    textColor=blue,
+    fontName='Times-Bold'
+)
+
+_WORD_STYLE = ParagraphStyle(
+    'Word',
+    parent=_STYLES['Normal'],
+    fontSize=12,
+    spaceAfter=8,
+    leftIndent=20,
+    fontName='Times-Roman'
+)
+
+_TRANSLATION_STYLE = ParagraphStyle(
+    'Translation',
+    parent=_STYLES['Normal'],
+    fontSize=10,
+    spaceAfter=10,
+    leftIndent=40,
+    textColor=black,
+    fontName='Times-Italic'
+)
+
+_FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=_STYLES['Normal'],
+    fontSize=9,
+    alignment=1,
+    fontName='Times-Roman'
+)
+
+# Bot emoji that the built-in PDF fonts cannot render
+_STRIP_TABLE = str.maketrans('', '', '\U0001F4DA\U0001F4C4\U0001F3F7\U0001F5D1\u2753\u2705\u274C\u2139\U0001F4A1\uFE0F')
+
+# Numbered word line, bound once instead of looked up per word
+_WORD_FMT = "{}. {}".format
+
+# Shorter word lists are drawn straight onto a canvas, skipping Platypus layout
+FAST_PDF_WORD_LIMIT = 50
+
+# SimpleDocTemplate's default 1 inch margins plus its frame's 6pt padding,
+# so both rendering paths place text in the same area
+_PAGE_WIDTH, _PAGE_HEIGHT = A4
+_PAGE_MARGIN = inch + 6
+
+def _word_entries(words, category_name):
+    """Yield (number, word, translation) for each word that has text left after cleaning."""
+    for i, word_data in enumerate(words, 1):
+        # Clean text
+        word_text = word_data.get('text', '').replace(f" {category_name}", '').strip()
+        word_text = word_text.translate(_STRIP_TABLE)
+        
+        if word_text:
+            translation = word_data.get('translation', '')
+            if translation:
+                translation = translation.translate(_STRIP_TABLE).strip()
+            yield i, word_text, translation
+
+def _footer_text(words) -> str:
+    """Return the generation time and word count line printed under a word list."""
+    return f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')} | Words: {len(words)}"
+
+def _category_story(words, category_name) -> list:
+    """Build the title, word list and footer flowables for one category."""
+    story = []
+    
+    # Title
+    title = Paragraph(f"{category_name} - Word List", _TITLE_STYLE)
+    story.append(title)
+    story.append(Spacer(1, 15))
+    
+    # Words
+    for i, word_text, translation in _word_entries(words, category_name):
+        word_paragraph = Paragraph(_WORD_FMT(i, word_text), _WORD_STYLE)
+        story.append(word_paragraph)
+        
+        # Translation
+        if translation:
+            translation_paragraph = Paragraph(f"   → {translation}", _TRANSLATION_STYLE)
+            story.append(translation_paragraph)
         
+        # Not shared across words: the frame flags flowables it postpones at a page break
+        story.append(Spacer(1, 3))
+    
+    # Footer
+    footer = Paragraph(_footer_text(words), _FOOTER_STYLE)
+    story.append(Spacer(1, 15))
+    story.append(footer)
+    
+    return story
+
+def generate_pdfs_batch(categories: List[Tuple[str, List[dict]]]) -> Optional[bytes]:
+    """Generate one PDF with a section per (category_name, words) pair and return its bytes."""
+    try:
         # Create PDF document
-        doc = SimpleDocTemplate(pdf_path, pagesize=A4)
-        styles = getSampleStyleSheet()
-        
-        # Use simple, built-in fonts that work well
-        title_style = ParagraphStyle(
-            'Title',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=1,
-            textColor=blue,
-            fontName='Times-Bold'
-        )
+        pdf_buffer = io.BytesIO()
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
         
-        word_style = ParagraphStyle(
-            'Word',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=8,
-            leftIndent=20,
-            fontName='Times-Roman'
-        )
+        # Build content, each category starting on a new page
+        story = []
+        for category_name, words in categories:
+            if story:
+                story.append(PageBreak())
+            story.extend(_category_story(words, category_name))
         
-        translation_style = ParagraphStyle(
-            'Translation',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=10,
-            leftIndent=40,
-            textColor=black,
-            fontName='Times-Italic'
-        )
+        # Build PDF
+        doc.build(story)
         
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=9,
-            alignment=1,
-            fontName='Times-Roman'
-        )
+        return pdf_buffer.getvalue()
         
-        # Build content
-        story = []
+    except Exception as e:
+        logger.error("Error generating PDF: %s", e)
+        return None
+
+def _generate_pdf_fast(words, category_name) -> Optional[bytes]:
+    """Draw a short word list directly onto a canvas and return the PDF bytes.
+
+    Lays text out with the same styles as _category_story, wrapping long
+    lines and starting a new page when the current one is full.
+    """
+    try:
+        pdf_buffer = io.BytesIO()
+        c = canvas.Canvas(pdf_buffer, pagesize=A4)
+        text_width = _PAGE_WIDTH - 2 * _PAGE_MARGIN
+        y = _PAGE_HEIGHT - _PAGE_MARGIN
         
-        # Title
-        title = Paragraph(f"{category_name} - Word List", title_style)
-        story.append(title)
-        story.append(Spacer(1, 15))
+        def draw(text, style):
+            nonlocal y
+            for line in simpleSplit(text, style.fontName, style.fontSize, text_width - style.leftIndent):
+                if y - style.leading < _PAGE_MARGIN:
+                    c.showPage()
+                    y = _PAGE_HEIGHT - _PAGE_MARGIN
+                y -= style.leading
+                # Set per line, since showPage resets the graphics state
+                c.setFont(style.fontName, style.fontSize)
+                c.setFillColor(style.textColor)
+                if style.alignment == TA_CENTER:
+                    c.drawCentredString(_PAGE_WIDTH / 2, y, line)
+                else:
+                    c.drawString(_PAGE_MARGIN + style.leftIndent, y, line)
+            y -= style.spaceAfter
         
-        # Words
-        for i, word_data in enumerate(words, 1):
-            # Clean text
-            word_text = word_data.get('text', '').replace(f" {category_name}", '').strip()
-            word_text = word_text.replace('📚', '').replace('📄', '').replace('🏷️', '').replace('🗑️', '').replace('❓', '').replace('✅', '').replace('❌', '').replace('ℹ️', '').replace('💡', '')
-            
-            if word_text:
-                word_paragraph = Paragraph(f"{i}. {word_text}", word_style)
-                story.append(word_paragraph)
-                
-                # Translation
-                translation = word_data.get('translation', '')
-                if translation:
-                    translation = translation.replace('📚', '').replace('📄', '').replace('🏷️', '').replace('🗑️', '').replace('❓', '').replace('✅', '').replace('❌', '').replace('ℹ️', '').replace('💡', '')
-                    if translation.strip():
-                        translation_paragraph = Paragraph(f"   → {translation.strip()}", translation_style)
-                        story.append(translation_paragraph)
-                
-                story.append(Spacer(1, 3))
+        draw(f"{category_name} - Word List", _TITLE_STYLE)
+        y -= 15
         
-        # Footer
-        footer = Paragraph(
-            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')} | Words: {len(words)}", 
-            footer_style
-        )
-        story.append(Spacer(1, 15))
-        story.append(footer)
+        for i, word_text, translation in _word_entries(words, category_name):
+            draw(_WORD_FMT(i, word_text), _WORD_STYLE)
+            if translation:
+                draw(f"→ {translation}", _TRANSLATION_STYLE)
+            y -= 3
         
-        # Build PDF
-        doc.build(story)
+        y -= 15
+        draw(_footer_text(words), _FOOTER_STYLE)
+        
+        c.showPage()
+        c.save()
         
-        return pdf_path
+        return pdf_buffer.getvalue()
         
     except Exception as e:
-        logger.error(f"Error generating PDF: {e}")
+        logger.error("Error generating PDF: %s", e)
+        return None
+
+def generate_pdf(words, category_name) -> Optional[bytes]:
+    """Generate a PDF with words from a category and return its bytes."""
+    if len(words) < FAST_PDF_WORD_LIMIT:
+        return _generate_pdf_fast(words, category_name)
+    return generate_pdfs_batch([(category_name, words)])
+
+async def render_pdf(words, category_name) -> Optional[bytes]:
+    """Run generate_pdf in the PDF worker pool, returning None if the worker fails."""
+    global pdf_pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pdf_pool, generate_pdf, words, category_name)
+    except concurrent.futures.process.BrokenProcessPool as e:
+        # A worker died (e.g. OOM-killed); the pool refuses all further work, so replace it
+        logger.error("PDF worker pool broke, restarting it: %s", e)
+        pdf_pool.shutdown(wait=False)
+        pdf_pool = concurrent.futures.ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return None
+    except Exception as e:
+        logger.error("Error generating PDF in worker: %s", e)
         return None
 
 def main():
     """Start the bot."""
     # Create the Application
-    application = Application.builder().token(TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
+    # Load the user once per update, before any other handler group runs
+    application.add_handler(TypeHandler(Update, load_user_context), group=-1)
+    
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
@@ -925,8 +1242,19 @@ def main():
     # Add callback query handler for inline buttons
     application.add_handler(CallbackQueryHandler(handle_callback_query))
     
-    # Start the Bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Start the Bot: use a webhook when WEBHOOK_URL is set, long polling otherwise
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=int(os.getenv('PORT', 8443)),
+            url_path=urlparse(webhook_url).path.lstrip('/'),
+            webhook_url=webhook_url,
+            secret_token=os.getenv('WEBHOOK_SECRET'),
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,5 +1,6 @@
 # Complete translations for all languages
 import os
+import functools
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -65,6 +66,7 @@ LANGUAGES = {
         'word_list_for': "So'zlar ro'yxati",
         'error_sending_pdf': "❌ PDF faylini yuborishda xatolik. Iltimos, qaytadan urinib ko'ring.",
         'error_generating_pdf': "❌ PDF yaratishda xatolik. Iltimos, qaytadan urinib ko'ring.",
+        'generating_pdf': "⏳ PDF yaratilmoqda...",
         'error_website': "❌ Veb-saytga ulanishda xatolik. Iltimos, qaytadan urinib ko'ring.",
         'request_timeout': "So'rov vaqti tugadi. Iltimos, qaytadan urinib ko'ring.",
         'language_set_english': "✅ Til ingliz tiliga o'rnatildi!\n\nEndi siz botni ingliz tilida ishlatishingiz mumkin.",
@@ -99,7 +101,8 @@ LANGUAGES = {
         'profile_not_registered': "❌ Siz hali ro'yxatdan o'tmagansiz!",
         'profile_register_first': "Profilni ko'rish uchun avval ro'yxatdan o'ting: /register",
         'user_synced_backend': "Foydalanuvchi ma'lumotlari veb-saytga sinxronlashtirildi",
-        'user_sync_failed': "Foydalanuvchi ma'lumotlarini sinxronlashtirish amalga oshmadi (veb-sayt ishlamayapti)"
+        'user_sync_failed': "Foydalanuvchi ma'lumotlarini sinxronlashtirish amalga oshmadi (veb-sayt ishlamayapti)",
+        'user_sync_pending': "Foydalanuvchi ma'lumotlari veb-sayt bilan sinxronlashtirilmoqda..."
     },
     'ru': {
         'welcome': "🤖 Добро пожаловать в бота для изучения языков!",
@@ -157,6 +160,7 @@ LANGUAGES = {
         'word_list_for': "Список слов для",
         'error_sending_pdf': "❌ Ошибка отправки PDF файла. Пожалуйста, попробуйте снова.",
         'error_generating_pdf': "❌ Ошибка создания PDF. Пожалуйста, попробуйте снова.",
+        'generating_pdf': "⏳ Создаю PDF...",
         'error_website': "❌ Ошибка подключения к веб-сайту. Пожалуйста, попробуйте снова.",
         'request_timeout': "Время запроса истекло. Пожалуйста, попробуйте снова.",
         'language_set_english': "✅ Language set to English!\n\nYou can now use the bot in English.",
@@ -191,7 +195,8 @@ LANGUAGES = {
         'profile_not_registered': "❌ Вы еще не зарегистрированы!",
         'profile_register_first': "Для просмотра профиля сначала зарегистрируйтесь: /register",
         'user_synced_backend': "Данные пользователя синхронизированы с веб-сайтом",
-        'user_sync_failed': "Синхронизация данных пользователя не удалась (веб-сайт недоступен)"
+        'user_sync_failed': "Синхронизация данных пользователя не удалась (веб-сайт недоступен)",
+        'user_sync_pending': "Синхронизация данных пользователя с веб-сайтом..."
     },
     'en': {
         'welcome': "🤖 Welcome to the Language Learning Bot!",
@@ -249,6 +254,7 @@ LANGUAGES = {
         'word_list_for': "Word list for",
         'error_sending_pdf': "❌ Error sending PDF file. Please try again.",
         'error_generating_pdf': "❌ Error generating PDF. Please try again.",
+        'generating_pdf': "⏳ Generating PDF...",
         'error_website': "❌ Error connecting to website. Please try again.",
         'request_timeout': "Request timed out. Please try again.",
         'language_set_english': "✅ Language set to English!\n\nYou can now use the bot in English.",
@@ -283,10 +289,13 @@ LANGUAGES = {
         'profile_not_registered': "❌ You are not registered yet!",
         'profile_register_first': "To view profile, register first: /register",
         'user_synced_backend': "User data synced to website",
-        'user_sync_failed': "User data sync failed (website offline)"
+        'user_sync_failed': "User data sync failed (website offline)",
+        'user_sync_pending': "Syncing user data to website..."
     }
 }
 
+# LANGUAGES never changes at runtime, so lookups are safe to memoize
+@functools.lru_cache(maxsize=2048)
 def get_text(key, lang='en'):
     """Get text in specified language."""
     return LANGUAGES.get(lang, LANGUAGES['en']).get(key, key) 
\ No newline at end of file
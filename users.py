@@ -1,50 +1,221 @@
-import json
 import os
+import sys
+import time
+import atexit
+import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
 
+import orjson
+from sortedcontainers import SortedList
+
 logger = logging.getLogger(__name__)
 
+# Rewrite the snapshot once the change log holds this many records
+COMPACT_EVERY = 10000
+LOG_BUFFER_SIZE = 64 * 1024
+
 class UserManager:
-    def __init__(self, users_file: str = "users.json"):
+    def __init__(self, users_file: str = "users.json", flush_interval: float = 5.0):
         self.users_file = users_file
+        # Changes are appended here and folded into users_file by compaction
+        self.log_file = f"{os.path.splitext(users_file)[0]}.log"
+        # The log being folded in by save_users_async() while new changes go to a fresh one
+        self.rotated_log_file = f"{self.log_file}.1"
+        self.flush_interval = flush_interval
+        self._ops_since_compact = 0
+        # Serializes snapshot writes, which share users_file's temp file
+        self._write_lock = threading.Lock()
         self.users = self.load_users()
+        # (last_activity_ts, user id) pairs, so recent users are a bisect away
+        self._activity_index = SortedList(
+            key for key in map(self._activity_key, self.users) if key is not None
+        )
+        # Opened on the first change, so loading users never touches the disk
+        self._log_fh = None
+        # A rotated log left by an interrupted save still has to be folded in
+        self._fold_pending = os.path.exists(self.rotated_log_file)
+        # Appends are buffered; run_flusher() pushes them to disk periodically
+        self._dirty = self._fold_pending
+        atexit.register(self.flush_sync)
     
     def load_users(self) -> Dict:
-        """Load users from JSON file."""
+        """Load users from the JSON snapshot and replay the change log on top."""
+        users = {}
         try:
             if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+                with open(self.users_file, 'rb') as f:
+                    # JSON object keys are strings; users are keyed by int in memory
+                    users = {int(k): v for k, v in orjson.loads(f.read()).items()}
         except Exception as e:
-            logger.error(f"Error loading users: {e}")
-            return {}
+            logger.error("Error loading users: %s", e)
+        # The rotated log is older, so it is replayed first
+        self._ops_since_compact = (
+            self._replay_log(users, self.rotated_log_file) + self._replay_log(users, self.log_file)
+        )
+        return users
+    
+    def _replay_log(self, users: Dict, log_file: str) -> int:
+        """Apply every record in a change log to users and return the record count."""
+        if not os.path.exists(log_file):
+            return 0
+        count = 0
+        with open(log_file, 'rb') as f:
+            for line in f:
+                try:
+                    self._apply(users, orjson.loads(line))
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping unreadable change log record: %s", e)
+                    continue
+                count += 1
+        return count
+    
+    def _open_log(self):
+        """Open the change log for buffered appends."""
+        log_fh = open(self.log_file, 'ab', buffering=LOG_BUFFER_SIZE)
+        # Terminate a record cut short by a crash so the next one starts on a new line
+        if log_fh.tell() > 0:
+            with open(self.log_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    log_fh.write(b'\n')
+        return log_fh
+    
+    @staticmethod
+    def _apply(users: Dict, record: Dict):
+        """Apply one change log record to users.
+
+        Records carry absolute values rather than deltas, so replaying a log
+        that is already folded into the snapshot leaves the data unchanged.
+        """
+        op = record['op']
+        uid = int(record['uid'])
+        if op == 'put':
+            users[uid] = record['user']
+        elif op == 'del':
+            users.pop(uid, None)
+        elif op == 'set' and uid in users:
+            user = users[uid]
+            for field, value in record['f'].items():
+                section, _, key = field.partition('.')
+                if key:
+                    user.setdefault(section, {})[key] = value
+                else:
+                    user[section] = value
+    
+    def _activity_key(self, user_id: int) -> Optional[Tuple[float, int]]:
+        """Return the activity index entry for a user, or None if it has no usable activity time."""
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        try:
+            return (self._timestamp(user, 'last_activity', 'last_activity_ts'), user_id)
+        except (KeyError, ValueError, TypeError):
+            return None
+    
+    def _record(self, record: Dict):
+        """Apply a change in memory and append it to the change log."""
+        old_key = self._activity_key(record['uid'])
+        self._apply(self.users, record)
+        new_key = self._activity_key(record['uid'])
+        if old_key != new_key:
+            if old_key is not None:
+                self._activity_index.discard(old_key)
+            if new_key is not None:
+                self._activity_index.add(new_key)
+        if self._log_fh is None:
+            self._log_fh = self._open_log()
+        self._log_fh.write(orjson.dumps(record) + b'\n')
+        self._ops_since_compact += 1
+        self._dirty = True
+    
+    def _serialize(self) -> bytes:
+        """Serialize users for writing to disk."""
+        return orjson.dumps(self.users, option=orjson.OPT_NON_STR_KEYS)
     
-    def save_users(self):
-        """Save users to JSON file."""
+    def _write_atomic(self, data: bytes):
+        """Write data to a temp file and swap it in, so the users file is never partial."""
+        tmp_file = f"{self.users_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self.users_file)
+    
+    def _write_snapshot(self, data: bytes):
+        """Write the snapshot, then drop the rotated log it now contains."""
+        with self._write_lock:
+            self._write_atomic(data)
+            if os.path.exists(self.rotated_log_file):
+                os.remove(self.rotated_log_file)
+    
+    async def save_users_async(self):
+        """Rewrite the users snapshot without blocking the event loop.
+
+        The change log is rotated first, so changes made while the snapshot is
+        written go to a fresh log instead of being truncated with the old one.
+        """
+        # A rotated log left by a failed save is still unfolded; keep it and fold both
+        if not self._fold_pending:
+            if self._log_fh is not None:
+                self._log_fh.close()
+                self._log_fh = None
+            if os.path.exists(self.log_file):
+                os.replace(self.log_file, self.rotated_log_file)
+            self._ops_since_compact = 0
+            self._fold_pending = True
+        # Serialize on the loop thread: handlers mutate self.users there, so a
+        # dump from the worker thread could see the dict change mid-iteration
+        await asyncio.to_thread(self._write_snapshot, self._serialize())
+        self._fold_pending = False
+    
+    def flush_sync(self):
+        """Write buffered changes to disk."""
+        try:
+            if self._log_fh is not None:
+                self._log_fh.flush()
+            self._dirty = False
+        except Exception as e:
+            logger.error("Error saving users: %s", e)
+    
+    async def flush(self):
+        """Write buffered changes without blocking the event loop, compacting when due."""
+        if not self._dirty:
+            return
+        self._dirty = False
         try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
+            if self._log_fh is not None:
+                await asyncio.to_thread(self._log_fh.flush)
+            # Retried on every flush until it succeeds, so a failed save is not left unfolded
+            if self._fold_pending or self._ops_since_compact >= COMPACT_EVERY:
+                await self.save_users_async()
         except Exception as e:
-            logger.error(f"Error saving users: {e}")
+            self._dirty = True
+            logger.error("Error saving users: %s", e)
+    
+    async def run_flusher(self):
+        """Flush buffered changes every flush_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
     
     def register_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None) -> bool:
         """Register a new user."""
-        user_id_str = str(user_id)
         
-        if user_id_str in self.users:
+        if user_id in self.users:
             return False  # User already exists
         
+        now = datetime.now()
         user_data = {
             'user_id': user_id,
             'username': username,
             'first_name': first_name,
             'last_name': last_name,
             'language': 'en',  # Default language
-            'registered_at': datetime.now().isoformat(),
-            'last_activity': datetime.now().isoformat(),
+            'registered_at': now.isoformat(),
+            'last_activity': now.isoformat(),
+            'registered_ts': now.timestamp(),
+            'last_activity_ts': now.timestamp(),
             'stats': {
                 'words_saved': 0,
                 'hashtags_created': 0,
@@ -58,39 +229,50 @@ class UserManager:
             }
         }
         
-        self.users[user_id_str] = user_data
-        self.save_users()
-        logger.info(f"New user registered: {user_id}")
+        self._record({'op': 'put', 'uid': user_id, 'user': user_data})
+        self.flush_sync()
+        logger.info("New user registered: %s", user_id)
         return True
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user data."""
-        user_id_str = str(user_id)
-        return self.users.get(user_id_str)
+        return self.users.get(user_id)
     
     def update_user_language(self, user_id: int, language: str):
         """Update user's language preference."""
-        user_id_str = str(user_id)
-        if user_id_str in self.users:
-            self.users[user_id_str]['language'] = language
-            self.users[user_id_str]['last_activity'] = datetime.now().isoformat()
-            self.save_users()
+        if user_id in self.users:
+            now = datetime.now()
+            self._record({'op': 'set', 'uid': user_id, 'f': {
+                'language': language,
+                'last_activity': now.isoformat(),
+                'last_activity_ts': now.timestamp()
+            }})
     
     def update_user_activity(self, user_id: int):
         """Update user's last activity time."""
-        user_id_str = str(user_id)
-        if user_id_str in self.users:
-            self.users[user_id_str]['last_activity'] = datetime.now().isoformat()
-            self.users[user_id_str]['stats']['total_messages'] += 1
-            self.save_users()
+        if user_id in self.users:
+            now = datetime.now()
+            self._record({'op': 'set', 'uid': user_id, 'f': {
+                'last_activity': now.isoformat(),
+                'last_activity_ts': now.timestamp(),
+                'stats.total_messages': self.users[user_id]['stats']['total_messages'] + 1
+            }})
     
     def increment_stat(self, user_id: int, stat_name: str):
         """Increment user statistic."""
-        user_id_str = str(user_id)
-        if user_id_str in self.users:
-            if stat_name in self.users[user_id_str]['stats']:
-                self.users[user_id_str]['stats'][stat_name] += 1
-                self.save_users()
+        if user_id in self.users:
+            stats = self.users[user_id]['stats']
+            if stat_name in stats:
+                self._record({'op': 'set', 'uid': user_id, 'f': {f'stats.{stat_name}': stats[stat_name] + 1}})
+    
+    @staticmethod
+    def _timestamp(user: Dict, iso_field: str, ts_field: str) -> float:
+        """Return user[ts_field], deriving it once from the ISO field for users saved before it existed."""
+        ts = user.get(ts_field)
+        if ts is None:
+            ts = datetime.fromisoformat(user[iso_field]).timestamp()
+            user[ts_field] = ts
+        return ts
     
     def get_user_stats(self, user_id: int) -> Dict:
         """Get user statistics."""
@@ -106,8 +288,8 @@ class UserManager:
             return {}
         
         # Calculate additional stats
-        registered_date = datetime.fromisoformat(user['registered_at'])
-        days_registered = (datetime.now() - registered_date).days
+        registered_ts = self._timestamp(user, 'registered_at', 'registered_ts')
+        days_registered = int((time.time() - registered_ts) / 86400)
         
         profile = {
             'user_id': user['user_id'],
@@ -125,12 +307,8 @@ class UserManager:
     
     def update_user_preference(self, user_id: int, preference: str, value):
         """Update user preference."""
-        user_id_str = str(user_id)
-        if user_id_str in self.users:
-            if 'preferences' not in self.users[user_id_str]:
-                self.users[user_id_str]['preferences'] = {}
-            self.users[user_id_str]['preferences'][preference] = value
-            self.save_users()
+        if user_id in self.users:
+            self._record({'op': 'set', 'uid': user_id, 'f': {f'preferences.{preference}': value}})
     
     def get_all_users(self) -> List[Dict]:
         """Get all users (for admin purposes)."""
@@ -138,10 +316,9 @@ class UserManager:
     
     def delete_user(self, user_id: int) -> bool:
         """Delete user (for admin purposes)."""
-        user_id_str = str(user_id)
-        if user_id_str in self.users:
-            del self.users[user_id_str]
-            self.save_users()
+        if user_id in self.users:
+            self._record({'op': 'del', 'uid': user_id})
+            self.flush_sync()
             return True
         return False
     
@@ -151,18 +328,18 @@ class UserManager:
     
     def get_active_users(self, days: int = 7) -> List[Dict]:
         """Get users active in the last N days."""
-        active_users = []
-        cutoff_date = datetime.now().timestamp() - (days * 24 * 60 * 60)
-        
-        for user in self.users.values():
-            try:
-                last_activity = datetime.fromisoformat(user['last_activity']).timestamp()
-                if last_activity > cutoff_date:
-                    active_users.append(user)
-            except:
-                continue
-        
-        return active_users
+        cutoff_date = time.time() - (days * 24 * 60 * 60)
+        start = self._activity_index.bisect_left((cutoff_date,))
+        return [self.users[user_id] for _, user_id in self._activity_index[start:]]
 
 # Global user manager instance
-user_manager = UserManager() 
\ No newline at end of file
+user_manager = UserManager()
+
+if __name__ == "__main__":
+    # users.json is written compact; `python users.py --pretty` dumps it readable for debugging
+    if "--pretty" in sys.argv[1:]:
+        sys.stdout.buffer.write(
+            orjson.dumps(user_manager.users, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS) + b"\n"
+        )
+    else:
+        print(f"{user_manager.get_users_count()} users; pass --pretty to dump them")